@@ -1,8 +1,9 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 from typing import Any, List, Optional
 from langchain_core.runnables import RunnableConfig
 import os
 from enum import Enum
+from functools import lru_cache
 
 class SearchAPI(Enum):
     ANTHROPIC = "anthropic"
@@ -299,14 +300,51 @@ class Configuration(BaseModel):
     def from_runnable_config(
         cls, config: Optional[RunnableConfig] = None
     ) -> "Configuration":
-        """Create a Configuration instance from a RunnableConfig."""
+        """Create a Configuration instance from a RunnableConfig.
+
+        Instances are memoized on the configured field values, so every node
+        of a run shares one object. Treat the result as read-only.
+        """
         configurable = config.get("configurable", {}) if config else {}
-        field_names = list(cls.model_fields.keys())
-        values: dict[str, Any] = {
-            field_name: os.environ.get(field_name.upper(), configurable.get(field_name))
-            for field_name in field_names
-        }
-        return cls(**{k: v for k, v in values.items() if v is not None})
+        key = tuple(configurable.get(field_name) for field_name in _UPPER_FIELD_NAMES)
+        try:
+            hash(key)
+        except TypeError:
+            # Unhashable values (e.g. an mcp_config dict) bypass the cache
+            return _build_config.__wrapped__(key)
+        return _build_config(key)
 
     class Config:
-        arbitrary_types_allowed = True
\ No newline at end of file
+        arbitrary_types_allowed = True
+
+
+_UPPER_FIELD_NAMES = {name: name.upper() for name in Configuration.model_fields}
+_FIELD_ADAPTERS = {
+    name: TypeAdapter(field.annotation)
+    for name, field in Configuration.model_fields.items()
+}
+
+# The environment does not change during a research run, so read it once
+_ENV_SNAPSHOT = dict(os.environ)
+
+
+def refresh_env() -> None:
+    """Re-read os.environ, e.g. after load_dotenv() or in tests."""
+    global _ENV_SNAPSHOT
+    _ENV_SNAPSHOT = dict(os.environ)
+    _build_config.cache_clear()
+
+
+@lru_cache(maxsize=128)
+def _build_config(configured: tuple) -> Configuration:
+    """Build a Configuration from configured values, with env vars taking precedence.
+
+    Only the fields that are actually set get validated; the rest keep
+    their defaults without a full model validation pass.
+    """
+    values: dict[str, Any] = {}
+    for (field_name, env_key), configured_value in zip(_UPPER_FIELD_NAMES.items(), configured):
+        value = _ENV_SNAPSHOT.get(env_key, configured_value)
+        if value is not None:
+            values[field_name] = _FIELD_ADAPTERS[field_name].validate_python(value)
+    return Configuration.model_construct(**values)
@@ -290,6 +290,7 @@ async def final_report_generation(state: AgentState, config: RunnableConfig):
             final_report = await writer_model.ainvoke([HumanMessage(content=final_report_prompt)])
             return {
                 "final_report": final_report.content, 
+                "final_report_failed": False,
                 "messages": [final_report],
                 **cleared_state
             }
@@ -300,6 +301,7 @@ async def final_report_generation(state: AgentState, config: RunnableConfig):
                     if not model_token_limit:
                         return {
                             "final_report": f"Error generating final report: Token limit exceeded, however, we could not determine the model's maximum context length. Please update the model map in deep_researcher/utils.py with this information. {e}",
+                            "final_report_failed": True,
                             **cleared_state
                         }
                     findings_token_limit = model_token_limit * 4
@@ -312,10 +314,12 @@ async def final_report_generation(state: AgentState, config: RunnableConfig):
                 # If not a token limit exceeded error, then we just throw an error.
                 return {
                     "final_report": f"Error generating final report: {e}",
+                    "final_report_failed": True,
                     **cleared_state
                 }
     return {
         "final_report": "Error generating final report: Maximum retries exceeded",
+        "final_report_failed": True,
         "messages": [final_report],
         **cleared_state
     }
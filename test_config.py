@@ -21,55 +21,68 @@ YELLOW = '\033[0;33m'
 BLUE = '\033[0;34m'
 NC = '\033[0m'  # No Color
 
-async def test_model_endpoint(model_type: str, base_url: str, api_key: str, model_name: str):
+async def test_model_endpoint(client: httpx.AsyncClient, model_type: str, base_url: str, api_key: str, model_name: str):
     """Test if a model endpoint is accessible"""
-    print(f"\n{BLUE}Testing {model_type} model...{NC}")
-    print(f"  Model: {model_name}")
-    print(f"  URL: {base_url}")
+    # Checks run concurrently, so collect the output and print it in one go
+    lines = [
+        f"\n{BLUE}Testing {model_type} model...{NC}",
+        f"  Model: {model_name}",
+        f"  URL: {base_url}",
+    ]
     
     try:
-        # Test endpoint connectivity
-        async with httpx.AsyncClient() as client:
-            # Try to get models list (OpenAI compatible)
-            headers = {"Authorization": f"Bearer {api_key}"}
-            response = await client.get(f"{base_url}/models", headers=headers, timeout=5.0)
-            
-            if response.status_code == 200:
-                print(f"{GREEN}✅ {model_type} endpoint is accessible{NC}")
-                return True
-            else:
-                print(f"{YELLOW}⚠️  {model_type} endpoint returned status {response.status_code}{NC}")
-                return True  # Still might work for chat completions
+        # Try to get models list (OpenAI compatible)
+        headers = {"Authorization": f"Bearer {api_key}"}
+        response = await client.get(f"{base_url}/models", headers=headers)
+        
+        if response.status_code == 200:
+            lines.append(f"{GREEN}✅ {model_type} endpoint is accessible{NC}")
+        else:
+            lines.append(f"{YELLOW}⚠️  {model_type} endpoint returned status {response.status_code}{NC}")
+        ok = True  # A non-200 might still work for chat completions
                 
     except httpx.ConnectError:
-        print(f"{RED}❌ Cannot connect to {model_type} endpoint at {base_url}{NC}")
+        lines.append(f"{RED}❌ Cannot connect to {model_type} endpoint at {base_url}{NC}")
         if "localhost:11434" in base_url:
-            print(f"{YELLOW}   Make sure Ollama is running: ollama serve{NC}")
-        return False
+            lines.append(f"{YELLOW}   Make sure Ollama is running: ollama serve{NC}")
+        ok = False
+    except httpx.TimeoutException:
+        lines.append(f"{YELLOW}⚠️  {model_type} endpoint timed out at {base_url}{NC}")
+        ok = True  # Might just be slow
+    except httpx.HTTPError as e:
+        lines.append(f"{YELLOW}⚠️  {model_type} endpoint test inconclusive: {e}{NC}")
+        ok = True  # Might still work
     except Exception as e:
-        print(f"{YELLOW}⚠️  {model_type} endpoint test inconclusive: {str(e)}{NC}")
-        return True  # Might still work
+        lines.append(f"{YELLOW}⚠️  {model_type} endpoint test failed unexpectedly: {e!r}{NC}")
+        ok = True  # Might still work
+    
+    print("\n".join(lines))
+    return ok
 
 async def test_tavily():
     """Test Tavily API key"""
-    print(f"\n{BLUE}Testing Tavily API...{NC}")
+    lines = [f"\n{BLUE}Testing Tavily API...{NC}"]
     api_key = os.getenv("TAVILY_API_KEY", "")
     
     if not api_key or api_key == "your-tavily-api-key-here":
-        print(f"{RED}❌ Tavily API key not configured{NC}")
-        print(f"{YELLOW}   Get your API key at: https://tavily.com{NC}")
+        lines.append(f"{RED}❌ Tavily API key not configured{NC}")
+        lines.append(f"{YELLOW}   Get your API key at: https://tavily.com{NC}")
+        print("\n".join(lines))
         return False
     
     try:
         from tavily import TavilyClient
         client = TavilyClient(api_key=api_key)
-        # Simple test search
-        results = client.search("test", max_results=1)
-        print(f"{GREEN}✅ Tavily API key is valid{NC}")
-        return True
+        # Simple test search; the client is blocking, so keep it off the event loop
+        results = await asyncio.to_thread(client.search, "test", max_results=1)
+        lines.append(f"{GREEN}✅ Tavily API key is valid{NC}")
+        ok = True
     except Exception as e:
-        print(f"{RED}❌ Tavily API error: {str(e)}{NC}")
-        return False
+        lines.append(f"{RED}❌ Tavily API error: {str(e)}{NC}")
+        ok = False
+    
+    print("\n".join(lines))
+    return ok
 
 async def main():
     print(f"{BLUE}{'='*60}{NC}")
@@ -78,25 +91,28 @@ async def main():
     
     all_good = True
     
-    # Test Tavily
-    tavily_ok = await test_tavily()
-    all_good = all_good and tavily_ok
-    
     # Test each model type
     model_types = ["SUMMARIZATION", "RESEARCH", "COMPRESSION", "FINAL_REPORT"]
     
-    for model_type in model_types:
-        model_name = os.getenv(f"{model_type}_MODEL_NAME", "")
-        base_url = os.getenv(f"{model_type}_MODEL_BASE_URL", "")
-        api_key = os.getenv(f"{model_type}_MODEL_API_KEY", "")
+    # Run all checks concurrently over one pooled client
+    async with httpx.AsyncClient(timeout=5.0) as client:
+        checks = [test_tavily()]
         
-        if not model_name or not base_url:
-            print(f"\n{RED}❌ {model_type} model not configured{NC}")
-            all_good = False
-            continue
+        for model_type in model_types:
+            model_name = os.getenv(f"{model_type}_MODEL_NAME", "")
+            base_url = os.getenv(f"{model_type}_MODEL_BASE_URL", "")
+            api_key = os.getenv(f"{model_type}_MODEL_API_KEY", "")
             
-        model_ok = await test_model_endpoint(model_type, base_url, api_key, model_name)
-        all_good = all_good and model_ok
+            if not model_name or not base_url:
+                print(f"\n{RED}❌ {model_type} model not configured{NC}")
+                all_good = False
+                continue
+                
+            checks.append(test_model_endpoint(client, model_type, base_url, api_key, model_name))
+        
+        results = await asyncio.gather(*checks)
+    
+    all_good = all_good and all(results)
     
     # Summary
     print(f"\n{BLUE}{'='*60}{NC}")
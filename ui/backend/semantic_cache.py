@@ -0,0 +1,180 @@
+"""Semantic cache for research reports"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Iterable, Optional
+
+import hnswlib
+import numpy as np
+from fastembed import TextEmbedding
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_DIM = 384
+INDEX_CAPACITY = 100_000
+SIMILARITY_THRESHOLD = 0.92
+CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase a query and collapse its whitespace"""
+    return " ".join(query.lower().split())
+
+
+def hash_query(query: str) -> str:
+    """Return the sha256 of a normalized query"""
+    return hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+
+
+class SemanticCache:
+    """Maps research queries to previously generated reports.
+
+    Lookups first try an exact match on the normalized query hash, then fall
+    back to the nearest cached query in an in-memory HNSW index.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        threshold: float = SIMILARITY_THRESHOLD,
+        ttl_seconds: int = CACHE_TTL_SECONDS,
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._model: Optional[TextEmbedding] = None
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS semantic_cache (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                query_hash TEXT NOT NULL,
+                query TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                report_path TEXT NOT NULL,
+                chat_id TEXT NOT NULL,
+                ts REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_semantic_cache_hash ON semantic_cache(query_hash)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_semantic_cache_chat ON semantic_cache(chat_id)"
+        )
+        # Expiry runs on every lookup, so it must not scan the table
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_semantic_cache_expires ON semantic_cache(expires_at)"
+        )
+        self._conn.commit()
+
+        # Approximate nearest neighbour index over the cached query embeddings,
+        # labelled with the semantic_cache row ids
+        rows = self._conn.execute(
+            "SELECT id, embedding FROM semantic_cache WHERE expires_at > ?", (time.time(),)
+        ).fetchall()
+        self._index = hnswlib.Index(space="cosine", dim=EMBEDDING_DIM)
+        self._index.init_index(max_elements=max(INDEX_CAPACITY, len(rows)), M=16, ef_construction=200)
+        self._size = 0
+        if rows:
+            self._index.add_items(
+                np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows]),
+                [row[0] for row in rows]
+            )
+            self._size = len(rows)
+
+    def embed(self, query: str) -> np.ndarray:
+        """Embed a query as a unit-length float32 vector"""
+        if self._model is None:
+            self._model = TextEmbedding(model_name=EMBEDDING_MODEL)
+        vector = np.asarray(next(iter(self._model.embed([normalize_query(query)]))), dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def _evict_expired(self):
+        expired = [
+            row[0] for row in self._conn.execute(
+                "SELECT id FROM semantic_cache WHERE expires_at <= ?", (time.time(),)
+            )
+        ]
+        if not expired:
+            return
+        self._conn.executemany("DELETE FROM semantic_cache WHERE id = ?", [(i,) for i in expired])
+        self._conn.commit()
+        self._drop_ids(expired)
+
+    def _drop_ids(self, ids: Iterable[int]):
+        for row_id in ids:
+            try:
+                self._index.mark_deleted(row_id)
+            except RuntimeError:
+                # Not in the index (expired before startup)
+                continue
+            self._size -= 1
+
+    def lookup(self, query: str) -> Optional[str]:
+        """Return the report path cached for a query, or None on a miss"""
+        with self._lock:
+            self._evict_expired()
+
+            row = self._conn.execute(
+                "SELECT report_path FROM semantic_cache WHERE query_hash = ? ORDER BY ts DESC LIMIT 1",
+                (hash_query(query),)
+            ).fetchone()
+            if row:
+                return row[0]
+
+            if self._size == 0:
+                return None
+
+            labels, distances = self._index.knn_query(self.embed(query), k=1)
+            # Cosine distance is 1 - similarity
+            if 1 - distances[0][0] < self.threshold:
+                return None
+
+            row = self._conn.execute(
+                "SELECT report_path FROM semantic_cache WHERE id = ?", (int(labels[0][0]),)
+            ).fetchone()
+            return row[0] if row else None
+
+    def add(self, query: str, report_path: str, chat_id: str):
+        """Cache the report generated for a query"""
+        embedding = self.embed(query)
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO semantic_cache (query_hash, query, embedding, report_path, chat_id, ts, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (hash_query(query), query, embedding.tobytes(), report_path, chat_id, now, now + self.ttl_seconds)
+            )
+            self._conn.commit()
+            if self._index.get_current_count() >= self._index.get_max_elements():
+                self._index.resize_index(self._index.get_max_elements() * 2)
+            self._index.add_items(embedding[np.newaxis, :], [cursor.lastrowid])
+            self._size += 1
+
+    def invalidate(self, report_path: str):
+        """Remove every entry pointing at a report"""
+        self._delete_where("report_path", report_path)
+
+    def invalidate_chat(self, chat_id: str):
+        """Remove every entry created by a chat"""
+        self._delete_where("chat_id", chat_id)
+
+    def _delete_where(self, column: str, value: str):
+        with self._lock:
+            ids = {
+                row[0] for row in self._conn.execute(
+                    f"SELECT id FROM semantic_cache WHERE {column} = ?", (value,)
+                )
+            }
+            if not ids:
+                return
+            self._conn.execute(f"DELETE FROM semantic_cache WHERE {column} = ?", (value,))
+            self._conn.commit()
+            self._drop_ids(ids)
+
+    def close(self):
+        """Close the cache's database connection"""
+        with self._lock:
+            self._conn.close()
@@ -3,24 +3,28 @@
 
 import os
 import sys
-import json
+import re
+import mimetypes
 import uuid
 import asyncio
+import hashlib
+from contextlib import asynccontextmanager
 from datetime import datetime
+from email.utils import formatdate
 from pathlib import Path
-from typing import Dict, List, Optional, Any, AsyncGenerator
-from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Any, AsyncGenerator, Tuple, Union, Set
 import sqlite3
-import aiofiles
-from collections import deque
+import threading
+import time
+import orjson
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent / "src"))
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import StreamingResponse, Response
 
 # LangChain imports
 from langchain_core.messages import HumanMessage, AIMessage
@@ -28,14 +32,27 @@ from langchain_core.callbacks import AsyncCallbackHandler
 from langchain_core.outputs import LLMResult
 from langchain_core.agents import AgentAction, AgentFinish
 
+from open_deep_research.configuration import Configuration, refresh_env
 from open_deep_research.deep_researcher import deep_researcher
 from dotenv import load_dotenv
 
+from semantic_cache import SemanticCache
+
 # Load environment variables
 load_dotenv()
+refresh_env()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Refresh query planner statistics for the indexes and close the database on shutdown"""
+    yield
+    with _db_lock:
+        _conn.execute("PRAGMA optimize")
+        _conn.close()
+    semantic_cache.close()
 
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -51,10 +68,36 @@ DB_PATH = "research_chats.db"
 REPORTS_DIR = Path("research_reports")
 REPORTS_DIR.mkdir(exist_ok=True)
 
+# Single connection shared by all helpers; SQLite serializes writes anyway
+_conn: Optional[sqlite3.Connection] = None
+_db_lock = threading.Lock()
+
+# Statement texts are constants so the connection's statement cache keeps them
+# prepared across calls
+_INSERT_CHAT = "INSERT INTO chats (id, title, created_at, updated_at) VALUES (?, ?, ?, ?)"
+_INSERT_MESSAGE = "INSERT INTO messages (id, chat_id, role, content, timestamp, report_path) VALUES (?, ?, ?, ?, ?, ?)"
+_TOUCH_CHAT = "UPDATE chats SET updated_at = ? WHERE id = ?"
+_SELECT_CHATS = """
+    SELECT c.id, c.title, c.created_at, c.updated_at,
+           (SELECT substr(m.content, 1, 200) FROM messages m
+            WHERE m.chat_id = c.id ORDER BY m.timestamp DESC LIMIT 1) AS last_message
+    FROM chats c
+    ORDER BY c.updated_at DESC
+"""
+_SELECT_MESSAGES = "SELECT id, chat_id, role, content, timestamp, report_path FROM messages WHERE chat_id = ? ORDER BY timestamp"
+_DELETE_MESSAGES = "DELETE FROM messages WHERE chat_id = ?"
+_DELETE_CHAT = "DELETE FROM chats WHERE id = ?"
+
 def init_db():
     """Initialize SQLite database for chat history"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    global _conn
+    _conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None, cached_statements=128)
+    cursor = _conn.cursor()
+    
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-20000")
     
     # Create chats table
     cursor.execute("""
@@ -79,27 +122,27 @@ def init_db():
         )
     """)
     
-    conn.commit()
-    conn.close()
+    # Serve per-chat message lookups and the chat list ordering from indexes
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_chat_id_ts ON messages(chat_id, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chats_updated ON chats(updated_at DESC)")
 
 # Initialize database
 init_db()
 
-@dataclass
-class ChatSession:
-    id: str
-    title: str
-    created_at: str
-    updated_at: str
-
-@dataclass
-class ChatMessage:
-    id: str
-    chat_id: str
-    role: str
-    content: str
-    timestamp: str
-    report_path: Optional[str] = None
+# Reports for previously answered (or near-duplicate) queries
+semantic_cache = SemanticCache(DB_PATH)
+
+# Cap concurrent research jobs so parallel sessions queue instead of hitting rate limits
+MAX_RESEARCH_JOBS = int(os.getenv("MAX_RESEARCH_JOBS", "3"))
+_research_sem = asyncio.Semaphore(MAX_RESEARCH_JOBS)
+
+# Greetings, test pings and fragments are answered without running any model
+TRIVIAL_PATTERNS = re.compile(r"^(hi|hello|hey|test|thanks|thank you|\W+|[a-z]{1,3})$", re.I)
+MIN_WORDS = 2
+# Chinese, Japanese and Korean text is often written without spaces, so there a
+# single "word" can be a whole question, e.g. "量子计算的最新进展是什么"
+UNSPACED_SCRIPT = re.compile(r"[\u1100-\u11ff\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]")
+MIN_UNSPACED_CHARS = 4
 
 # Session state management - store per WebSocket connection
 class SessionState:
@@ -110,87 +153,238 @@ class SessionState:
         self.chat_id: Optional[str] = None
         self.notes: List[str] = []
         self.final_report: str = ""
-        self.accumulated_tokens: deque = deque(maxlen=1000)  # Buffer for streaming
+        self._last_sent: Dict[str, Any] = {}  # State as last sent to the frontend
+        self.out_queue: asyncio.Queue = asyncio.Queue(maxsize=1000)  # Frames waiting for the relay task
+        self.closed: bool = False
+    
+    async def send(self, frame: Union[bytes, Dict[str, Any]]):
+        """Queue a frame for the socket; bytes are sent as already-encoded frames"""
+        if self.closed:
+            raise WebSocketDisconnect()
+        await self.out_queue.put(frame)
+
+async def relay_frames(websocket: WebSocket, session: SessionState):
+    """Drain a session's outbound queue into its socket"""
+    try:
+        while True:
+            frame = await session.out_queue.get()
+            # Dict frames are orjson-encoded; everything goes out as a binary frame
+            if not isinstance(frame, bytes):
+                try:
+                    frame = orjson.dumps(frame)
+                except TypeError as e:
+                    # Drop the one bad frame rather than the whole stream
+                    print(f"Could not encode WebSocket frame: {e}")
+                    continue
+            await websocket.send_bytes(frame)
+    except (WebSocketDisconnect, RuntimeError):
+        # The client went away; the receive loop sees the disconnect
+        pass
+    except Exception as e:
+        print(f"WebSocket relay error: {e}")
+    finally:
+        session.closed = True
+        # Wake any producer blocked on a full queue so it sees the session is closed
+        while not session.out_queue.empty():
+            session.out_queue.get_nowait()
 
 # Store active sessions
 active_sessions: Dict[WebSocket, SessionState] = {}
 
+def broadcast(payload: Dict[str, Any]):
+    """Queue a frame for every connected client without waiting on any of them.
+    
+    Sessions that are closed or whose queue is full are dropped from the registry.
+    """
+    # Encode once and hand every client the same bytes
+    frame = orjson.dumps(payload)
+    for websocket, session in list(active_sessions.items()):
+        if session.closed:
+            active_sessions.pop(websocket, None)
+            continue
+        try:
+            session.out_queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # A stalled client must not hold up the others
+            active_sessions.pop(websocket, None)
+
+async def emit_state(session: SessionState,
+                     event: Optional[Dict[str, Any]] = None, **delta):
+    """Send the state keys that changed since the last update.
+    
+    An event can ride along in the same frame instead of being sent separately.
+    """
+    changed = {
+        key: value for key, value in delta.items()
+        if key not in session._last_sent or session._last_sent[key] != value
+    }
+    if not changed and not event:
+        return
+    session._last_sent.update(changed)
+    
+    frame: Dict[str, Any] = {"type": "state", "data": changed}
+    if event:
+        frame["event"] = event["event"]
+        frame["event_data"] = event.get("data")
+    await session.send(frame)
+
+# Text appended to the streaming assistant message skips JSON entirely: it is
+# sent as a one-byte frame tag followed by the raw UTF-8 text. JSON frames
+# always start with "{", so the frontend can tell the two apart.
+RAW_TOKENS = b"\x01"
+RAW_STREAM = b"\x02"
+
+# Frames that never change are encoded once
+STREAM_START_FRAME = orjson.dumps({"type": "stream_start", "sender": "assistant"})
+STREAM_END_FRAME = orjson.dumps({"type": "stream_end", "sender": "assistant"})
+MODEL_END_FRAME = RAW_STREAM + "\n".encode("utf-8")
+RESEARCH_STARTING_FRAME = RAW_STREAM + "Starting deep research process...\n".encode("utf-8")
+REPORT_HEADER_FRAME = RAW_STREAM + "\n---\n\n# 📊 Final Research Report\n\n".encode("utf-8")
+
+def format_tool_input(input_str: Any) -> str:
+    """Pretty-print a tool input, passing strings that are not JSON through unchanged"""
+    if isinstance(input_str, str):
+        try:
+            input_str = orjson.loads(input_str)
+        except orjson.JSONDecodeError:
+            return input_str
+    return orjson.dumps(input_str, option=orjson.OPT_INDENT_2, default=str).decode()
+
+# Graph node that writes the final report
+REPORT_NODE = "final_report_generation"
+
+# Tokens are sent in batches of up to this many, or after this many seconds
+TOKEN_BATCH_SIZE = 32
+TOKEN_FLUSH_DELAY = 0.02
+
 # Custom callback handler for streaming
 class StreamingCallbackHandler(AsyncCallbackHandler):
     """Callback handler that streams all LangChain events to WebSocket"""
     
-    def __init__(self, websocket: WebSocket, session: SessionState):
-        self.websocket = websocket
+    def __init__(self, session: SessionState):
         self.session = session
-        self.current_tool = None
-        self.buffer = []
+        # Set once the report writer's tokens have started streaming under the report header
+        self.report_streamed = False
+        # Tool names by run_id; tools may run in parallel
+        self.tools: Dict[uuid.UUID, str] = {}
+        # Buffered tokens as UTF-8; whole tokens are appended so it always decodes cleanly
+        self.buffer = bytearray()
+        self.buffered_tokens = 0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_tasks: Set[asyncio.Task] = set()
         
     async def send_token(self, token: str):
-        """Send a single token to the frontend"""
-        await self.websocket.send_json({
-            "type": "token",
-            "content": token
-        })
+        """Queue a token, sending the batch once it is large enough or a short window passes"""
+        self.buffer.extend(token.encode("utf-8"))
+        self.buffered_tokens += 1
+        if self.buffered_tokens >= TOKEN_BATCH_SIZE:
+            await self.flush_tokens()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(TOKEN_FLUSH_DELAY, self._start_flush)
+    
+    def _start_flush(self):
+        """Timer callback: flush in a task the handler keeps a reference to"""
+        self._flush_handle = None
+        task = asyncio.create_task(self._timed_flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+    
+    async def _timed_flush(self):
+        try:
+            await self._send_buffer()
+        except WebSocketDisconnect:
+            # The session closed; the research loop sees it on its next send
+            pass
+    
+    async def _send_buffer(self):
+        if not self.buffer:
+            return
+        frame = RAW_TOKENS + self.buffer
+        self.buffer.clear()
+        self.buffered_tokens = 0
+        await self.session.send(frame)
+    
+    async def flush_tokens(self):
+        """Send any buffered tokens as a single frame"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flush_tasks:
+            # Let timer-started flushes finish first so frames stay in order
+            await asyncio.gather(*self._flush_tasks)
+        await self._send_buffer()
         
-    async def send_message(self, content: str, message_type: str = "info"):
+    async def send_report_token(self, token: str):
+        """Stream a report writer token, opening the report section on the first one"""
+        if not self.report_streamed:
+            await self.flush_tokens()
+            await self.session.send(REPORT_HEADER_FRAME)
+            self.report_streamed = True
+        await self.send_token(token)
+    
+    def cancel_flush(self):
+        """Drop any scheduled or running flush at the end of a turn"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        for task in self._flush_tasks:
+            task.cancel()
+    
+    async def send_message(self, content: str):
         """Send a formatted message"""
-        await self.websocket.send_json({
-            "type": "stream",
-            "message_type": message_type,
-            "content": content
-        })
+        # Buffered tokens were generated first, so they go out first
+        await self.flush_tokens()
+        await self.session.send(RAW_STREAM + content.encode("utf-8"))
     
     async def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], **kwargs) -> None:
         """Called when LLM starts"""
         model_name = serialized.get("name", "Unknown Model")
-        await self.send_message(f"\n🤖 **{model_name}** thinking...\n", "model_start")
-    
-    async def on_llm_new_token(self, token: str, **kwargs) -> None:
-        """Called on each new token from LLM"""
-        await self.send_token(token)
-        self.buffer.append(token)
+        await self.send_message(f"\n🤖 **{model_name}** thinking...\n")
     
     async def on_llm_end(self, response: LLMResult, **kwargs) -> None:
         """Called when LLM ends"""
-        await self.send_message("\n", "model_end")
-        # Clear buffer
-        self.buffer = []
+        await self.flush_tokens()
+        await self.session.send(MODEL_END_FRAME)
     
-    async def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs) -> None:
+    async def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *,
+                            run_id: Optional[uuid.UUID] = None, **kwargs) -> None:
         """Called when tool starts"""
         tool_name = serialized.get("name", "Unknown Tool")
-        self.current_tool = tool_name
-        await self.send_message(f"\n🔧 **Tool Call: {tool_name}**", "tool_start")
-        await self.send_message(f"```json\n{json.dumps(json.loads(input_str) if isinstance(input_str, str) else input_str, indent=2)}\n```", "tool_input")
+        self.tools[run_id] = tool_name
+        await self.send_message(f"\n🔧 **Tool Call: {tool_name}**")
+        await self.send_message(f"```json\n{format_tool_input(input_str)}\n```")
     
-    async def on_tool_end(self, output: str, **kwargs) -> None:
+    async def on_tool_end(self, output: str, *, run_id: Optional[uuid.UUID] = None, **kwargs) -> None:
         """Called when tool ends"""
-        await self.send_message(f"\n📤 **Tool Output ({self.current_tool}):**", "tool_output_header")
-        # Truncate very long outputs
+        tool_name = self.tools.pop(run_id, "Unknown Tool")
+        await self.send_message(f"\n📤 **Tool Output ({tool_name}):**")
+        # Clamp before formatting; tools may return huge scrapes or non-string objects
+        output = str(output)
+        preview = output[:1000]
         if len(output) > 1000:
-            output = output[:1000] + "\n... (truncated)"
-        await self.send_message(f"```\n{output}\n```\n", "tool_output")
-        self.current_tool = None
+            preview += f"\n... (truncated, {len(output)} characters)"
+        await self.send_message(f"```\n{preview}\n```\n")
     
-    async def on_tool_error(self, error: Exception, **kwargs) -> None:
+    async def on_tool_error(self, error: BaseException, *, run_id: Optional[uuid.UUID] = None, **kwargs) -> None:
         """Called on tool error"""
-        await self.send_message(f"\n❌ **Tool Error ({self.current_tool}):** {str(error)}\n", "tool_error")
+        tool_name = self.tools.pop(run_id, "Unknown Tool")
+        await self.send_message(f"\n❌ **Tool Error ({tool_name}):** {str(error)}\n")
     
     async def on_agent_action(self, action: AgentAction, **kwargs) -> None:
         """Called when agent takes an action"""
-        await self.send_message(f"\n🎯 **Agent Action:** {action.tool}", "agent_action")
+        await self.send_message(f"\n🎯 **Agent Action:** {action.tool}")
         if action.tool_input:
-            await self.send_message(f"Input: `{action.tool_input}`", "agent_input")
+            await self.send_message(f"Input: `{action.tool_input}`")
     
     async def on_agent_finish(self, finish: AgentFinish, **kwargs) -> None:
         """Called when agent finishes"""
-        await self.send_message("\n✅ **Agent completed research**\n", "agent_finish")
+        await self.send_message("\n✅ **Agent completed research**\n")
     
     async def on_chain_start(self, serialized: Dict[str, Any], inputs: Dict[str, Any], **kwargs) -> None:
         """Called when chain starts"""
         chain_name = serialized.get("name", "Chain")
         if chain_name != "RunnableSequence":  # Skip generic sequences
-            await self.send_message(f"\n🔗 **{chain_name} starting...**\n", "chain_start")
+            await self.send_message(f"\n🔗 **{chain_name} starting...**\n")
     
     async def on_chain_end(self, outputs: Dict[str, Any], **kwargs) -> None:
         """Called when chain ends"""
@@ -199,143 +393,319 @@ class StreamingCallbackHandler(AsyncCallbackHandler):
 # Database helper functions
 def save_chat(chat_id: str, title: str):
     """Save a new chat session"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
     now = datetime.now().isoformat()
-    cursor.execute(
-        "INSERT INTO chats (id, title, created_at, updated_at) VALUES (?, ?, ?, ?)",
-        (chat_id, title, now, now)
-    )
-    
-    conn.commit()
-    conn.close()
+    with _db_lock:
+        _conn.execute(_INSERT_CHAT, (chat_id, title, now, now))
 
-def save_message(chat_id: str, role: str, content: str, report_path: Optional[str] = None) -> str:
-    """Save a message to the database and return the message ID"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    message_id = str(uuid.uuid4())
-    now = datetime.now().isoformat()
-    
-    cursor.execute(
-        "INSERT INTO messages (id, chat_id, role, content, timestamp, report_path) VALUES (?, ?, ?, ?, ?, ?)",
-        (message_id, chat_id, role, content, now, report_path)
+# (id, chat_id, role, content, timestamp, report_path)
+MessageRow = Tuple[str, str, str, str, str, Optional[str]]
+
+def message_row(chat_id: str, role: str, content: str, report_path: Optional[str] = None,
+                now: Optional[datetime] = None) -> MessageRow:
+    """Build a messages row with a fresh ID, timestamped now unless a time is given"""
+    return (str(uuid.uuid4()), chat_id, role, content, (now or datetime.now()).isoformat(), report_path)
+
+def save_messages(rows: List[MessageRow], bump_chat: bool = False, new_chat: Optional[Tuple[str, str]] = None):
+    """Save a batch of messages in a single transaction.
+    
+    With bump_chat, each chat's updated_at is moved to its latest message.
+    Callers bump once per research turn rather than on every write.
+    new_chat is an (id, title) pair for a chat created in the same transaction.
+    """
+    if not rows:
+        return
+    
+    with _db_lock, _conn:
+        _conn.execute("BEGIN")
+        if new_chat:
+            _conn.execute(_INSERT_CHAT, (*new_chat, rows[0][4], rows[0][4]))
+        _conn.executemany(_INSERT_MESSAGE, rows)
+        
+        if bump_chat:
+            # Only the latest timestamp per chat matters for updated_at
+            touched = {row[1]: row[4] for row in rows}
+            _conn.executemany(_TOUCH_CHAT, [(now, chat_id) for chat_id, now in touched.items()])
+
+async def flush_messages(pending: List[MessageRow], bump_chat: bool = False,
+                         new_chat: Optional[Tuple[str, str]] = None):
+    """Persist buffered messages off the event loop and clear the buffer"""
+    if not pending:
+        return
+    rows = pending[:]
+    pending.clear()
+    await asyncio.to_thread(save_messages, rows, bump_chat, new_chat)
+
+def _rows_as_dicts(cursor: sqlite3.Cursor) -> List[Dict[str, Any]]:
+    """Read a cursor's rows as dicts keyed by column name"""
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor]
+
+def get_chats() -> List[Dict[str, Any]]:
+    """Get all chat sessions with a preview of their latest message"""
+    with _db_lock:
+        return _rows_as_dicts(_conn.execute(_SELECT_CHATS))
+
+def get_messages(chat_id: str) -> List[Dict[str, Any]]:
+    """Get messages for a chat"""
+    with _db_lock:
+        return _rows_as_dicts(_conn.execute(_SELECT_MESSAGES, (chat_id,)))
+
+def remove_chat(chat_id: str):
+    """Delete a chat and its messages"""
+    with _db_lock, _conn:
+        _conn.execute("BEGIN")
+        _conn.execute(_DELETE_MESSAGES, (chat_id,))
+        _conn.execute(_DELETE_CHAT, (chat_id,))
+
+def report_path_for(chat_id: str, now: Optional[datetime] = None) -> Path:
+    """Build the path a chat's report is saved to"""
+    timestamp = (now or datetime.now()).strftime("%Y%m%d_%H%M%S")
+    return REPORTS_DIR / f"report_{chat_id}_{timestamp}.md"
+
+async def save_report(query: str, report: str, chat_id: str, filepath: Optional[Path] = None,
+                      now: Optional[datetime] = None) -> str:
+    """Save report to disk and return the path"""
+    now = now or datetime.now()
+    filepath = filepath or report_path_for(chat_id, now)
+    
+    header = (
+        f"# Research Report\n\n"
+        f"**Query**: {query}\n\n"
+        f"**Date**: {now.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+        f"**Chat ID**: {chat_id}\n\n"
+        "---\n\n"
     )
+    await asyncio.to_thread(write_report, filepath, header, report)
     
-    # Update chat updated_at
-    cursor.execute(
-        "UPDATE chats SET updated_at = ? WHERE id = ?",
-        (now, chat_id)
+    return str(filepath)
+
+def write_report(filepath: Path, header: str, report: str):
+    """Write a report file in one buffered pass without concatenating header and body"""
+    with open(filepath, "w", encoding="utf-8") as f:
+        f.writelines((header, report))
+
+def load_report(report_path: str) -> Optional[str]:
+    """Load the report body written by save_report, or None if it is gone"""
+    try:
+        content = Path(report_path).read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
+    # Strip the header written by save_report
+    return content.split("---\n\n", 1)[-1]
+
+def report_summary(report: str) -> str:
+    """Summarize a report by its title line, used as the chat preview"""
+    for line in report.splitlines():
+        title = line.strip().lstrip("#").strip()
+        if title:
+            return title[:200]
+    return "Research complete"
+
+async def complete_research(callback_handler: "StreamingCallbackHandler",
+                            session: SessionState, final_report: str, report_path: str,
+                            pending: List[MessageRow], now: Optional[datetime] = None):
+    """Send the final report to the frontend and persist it.
+    
+    The assistant message is written while the report frames go out.
+    """
+    # The report itself is on disk; the message keeps a summary and points at it
+    pending.append(message_row(
+        session.chat_id, 
+        "assistant", 
+        report_summary(final_report),
+        report_path=report_path,
+        now=now
+    ))
+    await asyncio.gather(
+        flush_messages(pending, bump_chat=True),
+        send_final_report(callback_handler, session, final_report, report_path)
     )
-    
-    conn.commit()
-    conn.close()
-    
-    return message_id
 
-def get_chats() -> List[ChatSession]:
-    """Get all chat sessions"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+async def send_final_report(callback_handler: "StreamingCallbackHandler",
+                            session: SessionState, final_report: str, report_path: str):
+    """Send the final report, unless it was already streamed, and the completion events"""
+    if not callback_handler.report_streamed:
+        # Send final report with nice formatting
+        await session.send(REPORT_HEADER_FRAME)
+        await callback_handler.send_message(final_report)
     
-    cursor.execute("SELECT id, title, created_at, updated_at FROM chats ORDER BY updated_at DESC")
-    rows = cursor.fetchall()
+    if report_path:
+        await callback_handler.send_message(f"\n\n📄 *Report saved to: {report_path}*")
     
-    conn.close()
+    # End streaming
+    await session.send(STREAM_END_FRAME)
     
-    return [ChatSession(*row) for row in rows]
-
-def get_messages(chat_id: str) -> List[ChatMessage]:
-    """Get messages for a chat"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "SELECT id, chat_id, role, content, timestamp, report_path FROM messages WHERE chat_id = ? ORDER BY timestamp",
-        (chat_id,)
+    await emit_state(
+        session,
+        is_researching=False,
+        research_status=session.research_status
     )
-    rows = cursor.fetchall()
-    
-    conn.close()
     
-    return [ChatMessage(*row) for row in rows]
+    # Send completion event
+    await session.send({
+        "type": "event",
+        "event": "research_completed",
+        "data": {
+            "report_path": report_path
+        }
+    })
 
-async def save_report(query: str, report: str, chat_id: str) -> str:
-    """Save report to disk and return the path"""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"report_{chat_id}_{timestamp}.md"
-    filepath = REPORTS_DIR / filename
-    
-    async with aiofiles.open(filepath, "w", encoding="utf-8") as f:
-        await f.write(f"# Research Report\n\n")
-        await f.write(f"**Query**: {query}\n\n")
-        await f.write(f"**Date**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-        await f.write(f"**Chat ID**: {chat_id}\n\n")
-        await f.write("---\n\n")
-        await f.write(report)
+def is_trivial_query(query: str) -> bool:
+    """Check whether a query is too short or generic to research"""
+    if TRIVIAL_PATTERNS.match(query):
+        return True
+    if len(query.split()) >= MIN_WORDS:
+        return False
+    if UNSPACED_SCRIPT.search(query):
+        return len(query) < MIN_UNSPACED_CHARS
+    return True
+
+async def handle_trivial_query(query: str, session: SessionState,
+                               new_chat: Optional[Tuple[str, str]] = None):
+    """Reply to a trivial query without launching the researcher"""
+    if Configuration.from_runnable_config().allow_clarification:
+        reply = "Could you tell me a bit more about what you would like me to research? A sentence describing the topic works best."
+    else:
+        reply = "That does not look like a research question. Please describe the topic you would like researched."
+    
+    await session.send({
+        "type": "message",
+        "sender": "assistant",
+        "text": reply
+    })
+    await flush_messages([
+        message_row(session.chat_id, "user", query),
+        message_row(session.chat_id, "assistant", reply)
+    ], bump_chat=True, new_chat=new_chat)
+
+async def find_cached_report(query: str) -> Tuple[Optional[str], Optional[str]]:
+    """Return the path and text of a cached report for a query, or (None, None).
     
-    return str(filepath)
+    Cache failures are logged and treated as a miss.
+    """
+    try:
+        cached_path = await asyncio.to_thread(semantic_cache.lookup, query)
+        if not cached_path:
+            return None, None
+        cached_report = await asyncio.to_thread(load_report, cached_path)
+        if cached_report is None:
+            # The report file was removed, forget about it
+            await asyncio.to_thread(semantic_cache.invalidate, cached_path)
+            return None, None
+        return cached_path, cached_report
+    except Exception as e:
+        print(f"Semantic cache lookup failed: {e}")
+        return None, None
+
+async def cache_report(query: str, report_path: str, chat_id: str):
+    """Remember a finished report; a failed insert only loses the cache entry"""
+    try:
+        await asyncio.to_thread(semantic_cache.add, query, report_path, chat_id)
+    except Exception as e:
+        print(f"Semantic cache insert failed: {e}")
 
-async def handle_research_message(websocket: WebSocket, query: str, session: SessionState):
+async def handle_research_message(query: str, session: SessionState):
     """Handle a research query with full streaming"""
     
-    # Update session state
-    session.current_query = query
-    session.is_researching = True
-    session.research_status = "Starting research..."
-    
-    # Create or get chat ID
+    # Create or get chat ID; a new chat is saved together with its first message
+    new_chat: Optional[Tuple[str, str]] = None
     if not session.chat_id:
         session.chat_id = str(uuid.uuid4())
-        # Save new chat with query as title
-        save_chat(session.chat_id, query[:50] + "..." if len(query) > 50 else query)
+        new_chat = (session.chat_id, query[:50] + "..." if len(query) > 50 else query)
     
-    # Save user message
-    save_message(session.chat_id, "user", query)
+    if is_trivial_query(query):
+        await handle_trivial_query(query, session, new_chat)
+        return
     
-    # Send chat_id to frontend
-    await websocket.send_json({
-        "type": "state",
-        "data": {
-            "chat_id": session.chat_id,
-            "is_researching": True,
-            "research_status": "Starting research..."
-        }
-    })
+    # Update session state
+    session.current_query = query
+    session.is_researching = True
+    session.research_status = "Starting research..."
     
-    # Send research started event
-    await websocket.send_json({
-        "type": "event",
-        "event": "research_started",
-        "data": {"query": query}
-    })
+    # Buffer messages and write them in batches, off the event loop. The first
+    # batch creates a new chat, so it is written before the frontend hears the
+    # chat_id and reloads its chat list.
+    pending: List[MessageRow] = [message_row(session.chat_id, "user", query)]
+    await flush_messages(pending, new_chat=new_chat)
+    new_chat = None
+    
+    # Send chat_id to frontend together with the research started event
+    await emit_state(
+        session,
+        event={"event": "research_started", "data": {"query": query}},
+        chat_id=session.chat_id,
+        is_researching=True,
+        research_status=session.research_status
+    )
     
     # Create streaming callback handler
-    callback_handler = StreamingCallbackHandler(websocket, session)
+    callback_handler = StreamingCallbackHandler(session)
     
     # Start streaming message
-    await websocket.send_json({
-        "type": "stream_start",
-        "sender": "assistant"
-    })
+    await session.send(STREAM_START_FRAME)
     
     try:
         # Send initial message
-        await callback_handler.send_message(f"# 🔍 Research Query: {query}\n\n", "header")
-        await callback_handler.send_message("Starting deep research process...\n", "info")
+        await callback_handler.send_message(f"# 🔍 Research Query: {query}\n\n")
+        await session.send(RESEARCH_STARTING_FRAME)
+        
+        # Reuse the report of a previous (or near-duplicate) query if we have one
+        cached_path, cached_report = await find_cached_report(query)
+        
+        if cached_report is not None:
+            session.final_report = cached_report
+            session.is_researching = False
+            session.research_status = "Research complete!"
+            
+            await callback_handler.send_message("Found a matching previous report, skipping research.\n")
+            await complete_research(callback_handler, session, cached_report, cached_path, pending)
+            return
+        
+        queued = _research_sem.locked()
+        if queued:
+            session.research_status = "Waiting for a free research slot..."
+            await emit_state(session, research_status=session.research_status)
         
         # Run the deep researcher with streaming
         config = {"callbacks": [callback_handler]}
-        result = await deep_researcher.ainvoke(
-            {"messages": [HumanMessage(content=query)]},
-            config=config
-        )
+        queued_at = time.monotonic()
+        async with _research_sem:
+            started_at = time.monotonic()
+            print(f"Research slot acquired for chat {session.chat_id} after {started_at - queued_at:.1f}s")
+            if queued:
+                session.research_status = "Starting research..."
+                await emit_state(session, research_status=session.research_status)
+            try:
+                # Forward model tokens as they are generated; the outer graph's
+                # end event carries the final state
+                result: Dict[str, Any] = {}
+                async for event in deep_researcher.astream_events(
+                    {"messages": [HumanMessage(content=query)]},
+                    config=config,
+                    version="v2"
+                ):
+                    if event["event"] == "on_chat_model_stream":
+                        content = event["data"]["chunk"].content
+                        if not content or not isinstance(content, str):
+                            continue
+                        # The report writer streams under the report header, so
+                        # send_final_report does not have to send the text again
+                        if event.get("metadata", {}).get("langgraph_node") == REPORT_NODE:
+                            await callback_handler.send_report_token(content)
+                        else:
+                            await callback_handler.send_token(content)
+                    elif event["event"] == "on_chain_end" and not event.get("parent_ids"):
+                        result = event["data"].get("output") or {}
+                await callback_handler.flush_tokens()
+            finally:
+                print(f"Research slot released for chat {session.chat_id} after {time.monotonic() - started_at:.1f}s")
         
         # Extract report and notes
         final_report = result.get("final_report", "No report generated")
         notes = result.get("notes", [])
+        if result.get("final_report_failed"):
+            # What was streamed is not the report; show the error text instead
+            callback_handler.report_streamed = False
         
         # Update session state
         session.final_report = final_report
@@ -343,81 +713,65 @@ async def handle_research_message(websocket: WebSocket, query: str, session: Ses
         session.is_researching = False
         session.research_status = "Research complete!"
         
-        # Save the report
-        report_path = await save_report(query, final_report, session.chat_id)
-        
-        # Send final report with nice formatting
-        await callback_handler.send_message("\n---\n\n# 📊 Final Research Report\n\n", "report_header")
-        await callback_handler.send_message(final_report, "report_content")
-        
-        if report_path:
-            await callback_handler.send_message(f"\n\n📄 *Report saved to: {report_path}*", "report_saved")
-        
-        # End streaming
-        await websocket.send_json({
-            "type": "stream_end",
-            "sender": "assistant"
-        })
-        
-        # Save the complete interaction as assistant response
-        full_transcript = f"Research process completed. Final report:\n\n{final_report}"
-        save_message(
-            session.chat_id, 
-            "assistant", 
-            full_transcript,
-            report_path=report_path
+        # Write the report to disk while it is sent and its message is saved;
+        # the file name, report date and message share one timestamp
+        finished_at = datetime.now()
+        report_path = report_path_for(session.chat_id, finished_at)
+        await asyncio.gather(
+            save_report(query, final_report, session.chat_id, report_path, finished_at),
+            complete_research(callback_handler, session, final_report, str(report_path), pending,
+                              finished_at)
         )
-        
-        # Send completion event
-        await websocket.send_json({
-            "type": "event",
-            "event": "research_completed",
-            "data": {
-                "report": final_report,
-                "report_path": report_path
-            }
-        })
+        # Only cache real reports, never a writer error or the empty fallback
+        if result.get("final_report") and not result.get("final_report_failed"):
+            await cache_report(query, str(report_path), session.chat_id)
         
     except Exception as e:
         session.is_researching = False
         session.research_status = f"Error: {str(e)}"
         
-        await callback_handler.send_message(f"\n❌ **Error:** {str(e)}\n", "error")
+        # Save error message first; the sends below fail again if the client is gone
+        pending.append(message_row(session.chat_id, "assistant", f"Error during research: {str(e)}"))
+        await flush_messages(pending, bump_chat=True, new_chat=new_chat)
         
-        # End streaming
-        await websocket.send_json({
-            "type": "stream_end",
-            "sender": "assistant"
-        })
+        await callback_handler.send_message(f"\n❌ **Error:** {str(e)}\n")
+        await emit_state(
+            session,
+            is_researching=False,
+            research_status=session.research_status
+        )
         
-        # Save error message
-        save_message(session.chat_id, "assistant", f"Error during research: {str(e)}")
+        # End streaming
+        await session.send(STREAM_END_FRAME)
+    finally:
+        callback_handler.cancel_flush()
 
 # REST API endpoints
+def json_response(data: Any) -> Response:
+    """Encode plain JSON values with orjson, skipping FastAPI's jsonable_encoder pass"""
+    return Response(content=orjson.dumps(data), media_type="application/json")
+
 @app.get("/api/chats")
 async def list_chats():
     """Get all chat sessions"""
-    chats = get_chats()
-    return [asdict(chat) for chat in chats]
+    return json_response(await asyncio.to_thread(get_chats))
 
 @app.get("/api/chats/{chat_id}/messages")
 async def get_chat_messages(chat_id: str):
     """Get messages for a specific chat"""
-    messages = get_messages(chat_id)
-    return [asdict(msg) for msg in messages]
+    return json_response(await asyncio.to_thread(get_messages, chat_id))
 
 @app.delete("/api/chats/{chat_id}")
 async def delete_chat(chat_id: str):
     """Delete a chat and its messages"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
-    cursor.execute("DELETE FROM chats WHERE id = ?", (chat_id,))
-    
-    conn.commit()
-    conn.close()
-    
+    await asyncio.to_thread(remove_chat, chat_id)
+    # Forget the chat's reports so they are not replayed for other chats
+    try:
+        await asyncio.to_thread(semantic_cache.invalidate_chat, chat_id)
+    except Exception as e:
+        print(f"Semantic cache invalidation failed: {e}")
+    # Let other open tabs refresh their chat list
+    broadcast({"type": "event", "event": "chat_deleted", "data": {"chat_id": chat_id}})
     return {"status": "deleted"}
 
 @app.post("/api/chats")
@@ -425,7 +779,7 @@ async def create_chat(data: dict = {"title": "New Research"}):
     """Create a new chat session"""
     chat_id = str(uuid.uuid4())
     title = data.get("title", "New Research")
-    save_chat(chat_id, title)
+    await asyncio.to_thread(save_chat, chat_id, title)
     return {"id": chat_id, "title": title}
 
 # WebSocket endpoint
@@ -437,6 +791,7 @@ async def websocket_endpoint(websocket: WebSocket):
     # Create session state for this connection
     session = SessionState()
     active_sessions[websocket] = session
+    relay = asyncio.create_task(relay_frames(websocket, session))
     
     try:
         while True:
@@ -449,14 +804,12 @@ async def websocket_endpoint(websocket: WebSocket):
                 if chat_id:
                     session.chat_id = chat_id
                     # Send state update
-                    await websocket.send_json({
-                        "type": "state",
-                        "data": {
-                            "chat_id": chat_id,
-                            "is_researching": False,
-                            "research_status": ""
-                        }
-                    })
+                    await emit_state(
+                        session,
+                        chat_id=chat_id,
+                        is_researching=False,
+                        research_status=""
+                    )
             
             elif data.get("type") == "message" and data.get("sender") == "user":
                 query = data.get("text", "").strip()
@@ -466,14 +819,14 @@ async def websocket_endpoint(websocket: WebSocket):
                     session.chat_id = data["chat_id"]
                 
                 if not query:
-                    await websocket.send_json({
+                    await session.send({
                         "type": "message",
                         "sender": "assistant",
                         "text": "Please provide a research query."
                     })
                 else:
                     # Handle the research query
-                    await handle_research_message(websocket, query, session)
+                    await handle_research_message(query, session)
             
     except WebSocketDisconnect:
         print("Client disconnected")
@@ -482,23 +835,65 @@ async def websocket_endpoint(websocket: WebSocket):
         await websocket.close()
     finally:
         # Clean up session
+        relay.cancel()
         if websocket in active_sessions:
             del active_sessions[websocket]
 
-# Serve reports
-@app.get("/api/reports/{filename}")
-async def get_report(filename: str):
-    """Download a report file"""
-    filepath = REPORTS_DIR / filename
-    if not filepath.exists():
-        raise HTTPException(status_code=404, detail="Report not found")
-    return FileResponse(filepath, media_type="text/markdown", filename=filename)
+# Serve reports straight from disk; mounted before the frontend catch-all route
+mimetypes.add_type("text/markdown", ".md")
+app.mount("/api/reports", StaticFiles(directory=REPORTS_DIR), name="reports")
 
-# Serve frontend files
+# Serve frontend files from memory; the built SPA is small and does not change at runtime
 frontend_path = Path(__file__).parent.parent / "frontend" / "dist"
+
+def load_frontend_asset(asset: Path) -> Tuple[bytes, str, Dict[str, str]]:
+    """Read a built frontend file with its media type and caching headers"""
+    body = asset.read_bytes()
+    relative = asset.relative_to(frontend_path).as_posix()
+    headers = {
+        "ETag": f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"',
+        "Last-Modified": formatdate(asset.stat().st_mtime, usegmt=True),
+        # Vite puts a content hash in every file name under assets/; everything
+        # else (index.html) must be revalidated so new builds are picked up
+        "Cache-Control": "public, max-age=31536000, immutable" if relative.startswith("assets/") else "no-cache",
+    }
+    return body, mimetypes.guess_type(asset.name)[0] or "application/octet-stream", headers
+
 if frontend_path.exists():
-    app.mount("/", StaticFiles(directory=str(frontend_path), html=True), name="static")
+    FRONTEND_ASSETS: Dict[str, Tuple[bytes, str, Dict[str, str]]] = {
+        asset.relative_to(frontend_path).as_posix(): load_frontend_asset(asset)
+        for asset in frontend_path.rglob("*") if asset.is_file()
+    }
+    
+    @app.api_route("/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+    async def serve_frontend(path: str, request: Request):
+        """Serve a frontend asset, falling back to index.html for client-side routes"""
+        if path.startswith("api/"):
+            raise HTTPException(status_code=404, detail="Not found")
+        asset = FRONTEND_ASSETS.get(path) or FRONTEND_ASSETS.get("index.html")
+        if asset is None:
+            raise HTTPException(status_code=404, detail="Not found")
+        body, media_type, headers = asset
+        
+        # Answer revalidation with 304 when the client already has this version
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            if "*" in tags or headers["ETag"] in tags:
+                return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type=media_type, headers=headers)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # uvloop and httptools are C implementations of the event loop and HTTP
+    # parser; uvloop is not available on Windows. permessage-deflate is off so
+    # identical frames are not compressed again for every socket.
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=8000,
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        ws="websockets",
+        ws_per_message_deflate=False
+    )
\ No newline at end of file
@@ -9,39 +9,47 @@ def view_chats():
     conn = sqlite3.connect("research_chats.db")
     cursor = conn.cursor()
     
-    # Get all chats
-    cursor.execute("SELECT id, title, created_at, updated_at FROM chats ORDER BY updated_at DESC")
-    chats = cursor.fetchall()
+    # Get all chats with their messages in one query, newest chat first
+    cursor.execute("""
+        SELECT c.id, c.title, c.created_at, c.updated_at,
+               m.role, m.content, m.timestamp, m.report_path,
+               COUNT(m.id) OVER (PARTITION BY c.id) AS message_count
+        FROM chats c
+        LEFT JOIN messages m ON m.chat_id = c.id
+        ORDER BY c.updated_at DESC, c.id, m.timestamp
+    """)
     
     print("\n=== CHAT SESSIONS ===")
-    for chat in chats:
-        chat_id, title, created_at, updated_at = chat
-        print(f"\nChat ID: {chat_id}")
-        print(f"Title: {title}")
-        print(f"Created: {created_at}")
-        print(f"Updated: {updated_at}")
+    current_chat = None
+    # Iterate the cursor directly so rows are streamed rather than loaded at once
+    for chat_id, title, created_at, updated_at, role, content, timestamp, report_path, message_count in cursor:
+        if chat_id != current_chat:
+            if current_chat is not None:
+                print("\n" + "-" * 80)
+            current_chat = chat_id
+            print(f"\nChat ID: {chat_id}")
+            print(f"Title: {title}")
+            print(f"Created: {created_at}")
+            print(f"Updated: {updated_at}")
+            print(f"\nMessages ({message_count} total):")
         
-        # Get messages for this chat
-        cursor.execute(
-            "SELECT role, content, timestamp, report_path FROM messages WHERE chat_id = ? ORDER BY timestamp",
-            (chat_id,)
-        )
-        messages = cursor.fetchall()
-        
-        print(f"\nMessages ({len(messages)} total):")
-        for role, content, timestamp, report_path in messages:
-            print(f"\n[{timestamp}] {role.upper()}:")
-            # Truncate long content
-            if len(content) > 200:
-                print(f"{content[:200]}...")
-            else:
-                print(content)
-            if report_path:
-                print(f"Report saved to: {report_path}")
+        # Chats without messages come back as a single row of NULLs
+        if role is None:
+            continue
         
+        print(f"\n[{timestamp}] {role.upper()}:")
+        # Truncate long content
+        if len(content) > 200:
+            print(f"{content[:200]}...")
+        else:
+            print(content)
+        if report_path:
+            print(f"Report saved to: {report_path}")
+    
+    if current_chat is not None:
         print("\n" + "-" * 80)
     
     conn.close()
 
 if __name__ == "__main__":
-    view_chats()
\ No newline at end of file
+    view_chats()
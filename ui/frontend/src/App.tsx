@@ -19,6 +19,7 @@ interface Chat {
   title: string;
   created_at: string;
   updated_at: string;
+  last_message?: string | null;
 }
 
 interface Message {
@@ -38,7 +39,7 @@ interface AGUIMessage {
   event?: string;
   data?: any;
   content?: string;
-  message_type?: string;
+  event_data?: any;
 }
 
 interface AGUIState {
@@ -50,6 +51,12 @@ interface AGUIState {
   final_report: string;
 }
 
+// Tags of raw text frames, matching RAW_TOKENS / RAW_STREAM in the backend
+const RAW_FRAME_TYPES: Record<number, string> = {
+  0x01: 'tokens',
+  0x02: 'stream'
+};
+
 const App: React.FC = () => {
   const [chats, setChats] = useState<Chat[]>([]);
   const [currentChatId, setCurrentChatId] = useState<string | null>(null);
@@ -89,6 +96,9 @@ const App: React.FC = () => {
 
   const connectWebSocket = () => {
     const ws = new WebSocket('ws://localhost:8000/ws');
+    // Frames arrive as binary UTF-8 JSON
+    ws.binaryType = 'arraybuffer';
+    const decoder = new TextDecoder();
     
     ws.onopen = () => {
       console.log('Connected to server');
@@ -96,7 +106,17 @@ const App: React.FC = () => {
     };
     
     ws.onmessage = (event) => {
-      const message: AGUIMessage = JSON.parse(event.data);
+      let message: AGUIMessage;
+      if (typeof event.data === 'string') {
+        message = JSON.parse(event.data);
+      } else {
+        // Streamed text is a one-byte tag followed by raw UTF-8; other frames are JSON
+        const bytes = new Uint8Array(event.data);
+        const rawType = RAW_FRAME_TYPES[bytes[0]];
+        message = rawType
+          ? { type: rawType, content: decoder.decode(bytes.subarray(1)) }
+          : JSON.parse(decoder.decode(bytes));
+      }
       console.log('Server message:', message);
       
       if (message.type === 'stream_start') {
@@ -114,7 +134,7 @@ const App: React.FC = () => {
         setStreamingMessageId(newMessageId);
         setStreamBuffer('');
         setIsLoading(false);
-      } else if (message.type === 'stream' || message.type === 'token') {
+      } else if (message.type === 'stream' || message.type === 'token' || message.type === 'tokens') {
         // Append to streaming message
         if (streamingMessageId) {
           const content = message.content || '';
@@ -162,11 +182,17 @@ const App: React.FC = () => {
           }
         } else if (message.event === 'research_progress') {
           console.log('Progress:', message.data);
+        } else if (message.event === 'chat_deleted') {
+          loadChats();
         }
       } else if (message.type === 'state') {
-        // Update agent state
-        const stateData = message.data as AGUIState;
-        setAgentState(stateData);
+        // Merge agent state; the server only sends keys that changed
+        const stateData = message.data as Partial<AGUIState>;
+        setAgentState(prev => ({ ...prev, ...stateData }));
+        
+        if (message.event === 'research_started') {
+          setIsLoading(true);
+        }
         
         // Update current chat ID if provided
         if (stateData.chat_id) {
@@ -219,7 +245,19 @@ const App: React.FC = () => {
   const loadMessages = async (chatId: string) => {
     try {
       const response = await axios.get(`/api/chats/${chatId}/messages`);
-      setMessages(response.data);
+      // Research answers are stored as a pointer to the report file; load the report itself
+      const loaded: Message[] = await Promise.all(response.data.map(async (msg: Message) => {
+        if (!msg.report_path) return msg;
+        try {
+          const report = await axios.get(`/api/reports/${msg.report_path.split('/').pop()}`, {
+            responseType: 'text'
+          });
+          return { ...msg, content: report.data };
+        } catch (error) {
+          return msg;
+        }
+      }));
+      setMessages(loaded);
     } catch (error) {
       console.error('Error loading messages:', error);
     }
@@ -395,6 +433,9 @@ const App: React.FC = () => {
                 <FileText size={16} className="flex-shrink-0" />
                 <div className="flex-1 min-w-0">
                   <div className="text-sm font-medium truncate">{chat.title}</div>
+                  {chat.last_message && (
+                    <div className="text-xs text-gray-500 truncate">{chat.last_message}</div>
+                  )}
                   <div className="text-xs text-gray-400">
                     {format(new Date(chat.updated_at), 'MMM d, yyyy')}
                   </div>